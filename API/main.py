@@ -1,24 +1,76 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict
+import msgspec
+from typing import List, Deque, Optional, Tuple
+from collections import deque
 import numpy as np
+import os
 import time
 import logging
-from fastapi.responses import HTMLResponse
-import matplotlib
-matplotlib.use('Agg')  # Usa um backend sem GUI
-import matplotlib.pyplot as plt
+import logging.handlers
+import queue
+import atexit
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
+import orjson
+import gzip
 import io
-import base64
-from tensorflow.keras.models import load_model
-from sklearn.preprocessing import MinMaxScaler
+import asyncio
+from contextlib import asynccontextmanager, suppress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+# A API roda em CPU: sem GPUs visíveis o TensorFlow não inicializa o CUDA, o que acelera a
+# inicialização e reduz a memória (defina CUDA_VISIBLE_DEVICES para usar uma GPU)
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+import tensorflow as tf
+from tensorflow.keras.models import load_model, Sequential
+from tensorflow.keras.layers import Input, LSTM
 
 # Configuração do logger para monitoramento
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# A escrita dos logs é feita em uma thread separada (QueueHandler + QueueListener), fora do caminho das requisições
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))  # O formato final é aplicado pelo listener
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+log_listener.start()
+atexit.register(log_listener.stop)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida da aplicação: cria a fila e a thread de inferência, aquece o modelo e inicia
+    a tarefa de micro-batching na inicialização; no desligamento, cancela a tarefa, falha as
+    previsões ainda pendentes e encerra a thread de inferência.
+    """
+    global inference_queue, inference_executor, active_forecasts
+    inference_queue = asyncio.Queue()
+    inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+    active_forecasts = 0
+
+    # O aquecimento roda na thread de inferência, a mesma usada pelas requisições
+    await asyncio.get_running_loop().run_in_executor(inference_executor, warm_up_model)
+    batch_task = asyncio.create_task(batch_inference_loop())
+    try:
+        yield
+    finally:
+        batch_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await batch_task
+
+        # Janelas que ficaram na fila sem chegar a um lote
+        pending = []
+        while not inference_queue.empty():
+            pending.append(inference_queue.get_nowait())
+        fail_pending_forecasts(pending, RuntimeError("A API está sendo encerrada."))
+        inference_executor.shutdown(wait=False, cancel_futures=True)
 
 # Inicialização do aplicativo FastAPI
-app = FastAPI()
+# As respostas JSON são serializadas com orjson (em Rust), mais rápido que o módulo json padrão
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Configuração do CORS para permitir requisições de qualquer origem
 app.add_middleware(
@@ -29,77 +81,467 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Threads do TensorFlow: o LSTM é pequeno, então poucas threads evitam que o custo de acordá-las
+# supere o das próprias multiplicações de matrizes. Configuráveis por variáveis de ambiente.
+TF_INTRA_OP_THREADS = int(os.getenv("TF_INTRA_OP_THREADS", "2"))
+TF_INTER_OP_THREADS = int(os.getenv("TF_INTER_OP_THREADS", "1"))
+tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+
+# Compilação automática com XLA dos grafos do TensorFlow (desabilitada com TF_XLA_JIT=0)
+tf.config.optimizer.set_jit(os.getenv("TF_XLA_JIT", "1") == "1")
+
 # Carregando o modelo LSTM salvo
 MODEL_PATH = 'modelo_lstm_predicao_acoes.h5'
 try:
     model = load_model(MODEL_PATH)
-    logging.info("Modelo carregado com sucesso.")
+    logger.info("Modelo carregado com sucesso.")
 except Exception as e:
-    logging.error(f"Erro ao carregar o modelo: {e}")
+    logger.error("Erro ao carregar o modelo: %s", e)
     model = None
 
-# Configurando o escalador MinMaxScaler
-scaler = MinMaxScaler(feature_range=(0, 1))
+# Convertendo o modelo para TFLite com quantização dinâmica (pesos em INT8) para inferência em CPU
+interpreter = None
+interpreter_lock = threading.Lock()  # O interpretador TFLite não é thread-safe
+
+# Threads do interpretador: as mesmas do TensorFlow, limitadas aos núcleos disponíveis, pois as
+# threads do XNNPACK aguardam ativamente umas pelas outras e ficam muito lentas disputando um núcleo
+TFLITE_THREADS = max(1, min(TF_INTRA_OP_THREADS, os.cpu_count() or 1))
+if model is not None:
+    try:
+        concrete_func = tf.function(lambda x: model(x, training=False)).get_concrete_function(
+            tf.TensorSpec((None, 60, 1), tf.float32)
+        )
+        # O conversor precisa rastrear as variáveis do TensorFlow por trás das variáveis do Keras 3
+        # para congelá-las como constantes no modelo TFLite
+        model_variables = tf.Module()
+        model_variables.weights = [variable.value for variable in model.variables]
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func], model_variables)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+            tf.lite.OpsSet.SELECT_TF_OPS,
+        ]
+        interpreter = tf.lite.Interpreter(model_content=converter.convert(), num_threads=TFLITE_THREADS)
+        interpreter.allocate_tensors()
+        input_details = interpreter.get_input_details()[0]
+        input_index, input_dtype = input_details["index"], input_details["dtype"]
+        input_batch_size = int(input_details["shape"][0])  # Tamanho de lote alocado no interpretador
+        output_index = interpreter.get_output_details()[0]["index"]
+
+        # Valida o modelo convertido com uma inferência de teste, voltando ao Keras em caso de falha
+        interpreter.set_tensor(input_index, np.zeros((1, 60, 1), dtype=input_dtype))
+        interpreter.invoke()
+        logger.info("Modelo convertido para TFLite com sucesso.")
+    except Exception as e:
+        logger.warning("Não foi possível converter o modelo para TFLite, usando Keras: %s", e)
+        interpreter = None
+
+# Função concreta compilada com XLA para o caminho Keras, usada apenas sem o interpretador TFLite:
+# traçada uma única vez na carga, com a janela fixa de 60 passos. O XLA compila cada tamanho de lote
+# separadamente, então o micro-batcher só envia os tamanhos de BATCH_SIZES, aquecidos na inicialização
+predict_fn = None
+if model is not None and interpreter is None:
+    try:
+        predict_fn = tf.function(
+            lambda x: model(x, training=False),
+            jit_compile=True,
+            input_signature=[tf.TensorSpec((None, 60, 1), tf.float32)],
+        ).get_concrete_function()
+        predict_fn(tf.zeros((1, 60, 1), tf.float32))
+    except Exception as e:
+        logger.warning("Não foi possível compilar o modelo com XLA: %s", e)
+        predict_fn = None
+
+def run_model(batch: np.ndarray) -> np.ndarray:
+    """
+    Executa um passo de inferência do LSTM para um lote no formato (B, 60, 1).
+    Usa o interpretador TFLite quando disponível e o modelo Keras caso contrário.
+    """
+    if interpreter is None:
+        if predict_fn is not None:
+            return predict_fn(tf.constant(batch, dtype=tf.float32)).numpy()
+        return model(batch, training=False).numpy()
+
+    global input_batch_size
+    with interpreter_lock:
+        # Redimensiona a entrada do interpretador somente quando o tamanho do lote muda
+        if input_batch_size != batch.shape[0]:
+            interpreter.resize_tensor_input(input_index, batch.shape)
+            interpreter.allocate_tensors()
+            input_batch_size = batch.shape[0]
+        # As janelas já chegam em float32; a conversão só copia se o modelo esperar outro tipo
+        interpreter.set_tensor(input_index, batch.astype(input_dtype, copy=False))
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index)
+
+# Modo stateful (opcional): uma cópia do modelo com LSTMs stateful mantém o estado oculto entre
+# as chamadas, então cada dia futuro avalia um único passo da célula em vez da janela de 60 dias.
+# A janela deixa de deslizar (o estado acumula todo o histórico), então as previsões podem diferir
+# levemente do modo padrão. Habilitado com STATEFUL_INFERENCE=1.
+STATEFUL_INFERENCE = os.getenv("STATEFUL_INFERENCE", "0") == "1"
+stateful_model = None
+stateful_window_fn = None
+stateful_step_fn = None
+stateful_lock = threading.Lock()  # O estado do modelo pertence a uma previsão por vez
+
+def build_stateful_model(base_model):
+    """
+    Constrói uma cópia do modelo com as camadas LSTM stateful e lote de tamanho 1,
+    aceitando sequências de qualquer tamanho e reutilizando os pesos do modelo treinado.
+    """
+    layers = [Input(batch_shape=(1, None, 1))]
+    for layer in base_model.layers:
+        config = layer.get_config()
+        if isinstance(layer, LSTM):
+            config["stateful"] = True
+        layers.append(layer.__class__.from_config(config))
+
+    twin = Sequential(layers)
+    twin.set_weights(base_model.get_weights())
+    return twin
+
+if STATEFUL_INFERENCE and model is not None:
+    try:
+        stateful_model = build_stateful_model(model)
+
+        # Funções concretas com assinaturas fixas para a janela inicial e para um único passo,
+        # evitando o overhead das chamadas eager do Keras a cada dia previsto
+        stateful_window_fn = tf.function(
+            lambda x: stateful_model(x, training=False),
+            input_signature=[tf.TensorSpec((1, None, 1), tf.float32)],
+        ).get_concrete_function()
+        stateful_step_fn = tf.function(
+            lambda x: stateful_model(x, training=False),
+            input_signature=[tf.TensorSpec((1, 1, 1), tf.float32)],
+        ).get_concrete_function()
+        logger.info("Modelo stateful criado com sucesso.")
+    except Exception as e:
+        logger.warning("Não foi possível criar o modelo stateful, usando a janela deslizante: %s", e)
+        stateful_model = None
+
+def forecast_stateful(window: np.ndarray, days_ahead: int) -> np.ndarray:
+    """
+    Previsão autorregressiva com o modelo stateful: a janela é processada uma única vez
+    para aquecer o estado e cada dia seguinte avalia apenas um passo da célula LSTM.
+    Retorna as previsões normalizadas.
+    """
+    future_prices = np.empty(days_ahead, dtype=np.float64)
+    step_input = np.empty((1, 1, 1), dtype=np.float32)
+
+    with stateful_lock:
+        for layer in stateful_model.layers:
+            if isinstance(layer, LSTM):
+                layer.reset_state()
+
+        prediction = stateful_window_fn(tf.constant(window.reshape(1, -1, 1))).numpy()[0, 0]
+        future_prices[0] = prediction
+        for step in range(1, days_ahead):
+            step_input[0, 0, 0] = prediction
+            prediction = stateful_step_fn(tf.constant(step_input)).numpy()[0, 0]
+            future_prices[step] = prediction
+
+    return future_prices
+
+class SlidingWindow:
+    """
+    Janela deslizante de tamanho fixo sobre um buffer circular espelhado (2 × tamanho).
+    Cada novo valor é escrito em duas posições do buffer e `view()` retorna sempre uma fatia
+    contígua com os valores em ordem, sem copiar nem deslocar os elementos a cada passo.
+    """
+    def __init__(self, values: np.ndarray):
+        self.size = values.shape[0]
+        self.buffer = np.concatenate((values, values)).astype(np.float32, copy=False)
+        self.head = 0
+
+    def append(self, value):
+        self.buffer[self.head] = value
+        self.buffer[self.head + self.size] = value
+        self.head = (self.head + 1) % self.size
+
+    def view(self) -> np.ndarray:
+        return self.buffer[self.head:self.head + self.size]
+
+# Carregando o escalador MinMaxScaler ajustado durante o treinamento
+SCALER_PATH = 'scaler.pkl'
+try:
+    scaler = joblib.load(SCALER_PATH)
+    # Constantes da normalização pré-calculadas, dispensando o sklearn durante as requisições
+    DATA_MIN = float(scaler.data_min_[0])
+    DATA_RANGE = float(scaler.data_range_[0])
+    INV_RANGE = 1.0 / DATA_RANGE
+    logger.info("Escalador carregado com sucesso.")
+except Exception as e:
+    logger.warning("Escalador do treinamento não encontrado, normalizando cada requisição pelo mínimo e amplitude do seu próprio histórico: %s", e)
+    scaler = None
 
 # Classe para validar os dados de entrada fornecidos pelo usuário
-class HistoricalData(BaseModel):
+class HistoricalData(msgspec.Struct):
     """
     Representa os dados de entrada esperados pela API para previsão de preços.
+    A decodificação e a validação dos tipos são feitas pelo msgspec, em C.
     - `prices`: Lista de preços históricos.
     - `days_ahead`: Número de dias futuros para prever.
     - `real_values`: Lista de valores reais.
     """
     prices: List[float]
     days_ahead: int
-    real_values: List[float] = None
+    real_values: Optional[List[float]] = None
+
+# Decodificador reutilizado entre as requisições, evitando reconstruir a validação a cada chamada
+historical_data_decoder = msgspec.json.Decoder(HistoricalData)
+
+# Schema do corpo da requisição para a documentação (Swagger), já que o FastAPI não lê o corpo diretamente
+_, _schema_components = msgspec.json.schema_components([HistoricalData], ref_template="#/components/schemas/{name}")
+HISTORICAL_DATA_SCHEMA = _schema_components["HistoricalData"]
+
+# Lista para armazenar os tempos de resposta das requisições ao /predict como tuplas
+# (tempo em nanossegundos, dias futuros), limitada aos registros mais recentes
+MAX_PERFORMANCE_RECORDS = 10000
+performance_data: Deque[Tuple[int, int]] = deque(maxlen=MAX_PERFORMANCE_RECORDS)
 
-# Lista para armazenar os tempos de resposta das requisições
-performance_data: List[Dict[str, float]] = []
+# Total de registros já armazenados; identifica cada requisição mesmo após o descarte dos mais antigos
+performance_total = 0
+
+# Registros de performance já serializados em JSON, com o mesmo limite de performance_data:
+# cada chamada ao /performance serializa apenas os registros novos desde a anterior
+performance_json_entries: Deque[bytes] = deque(maxlen=MAX_PERFORMANCE_RECORDS)
+performance_json_cache = {"total": 0, "body": b'{"performance":[]}'}
 
 # Lista para armazenar os dados de acurácia
 accuracy_data = []
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
+# Cache do HTML dos gráficos, regenerado somente quando chegam novos dados
+performance_plot_cache = {"total": -1, "html": None}
+accuracy_plot_cache = {"len": -1, "html": None}
+interface_cache = {"len": -1, "html": None, "gzip": None}
+INTERFACE_GZIP_HEADERS = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+PLOT_CACHE_HEADERS = {"Cache-Control": "max-age=10"}  # Permite que o navegador também reutilize o gráfico
+
+MAX_PLOT_POINTS = 2000  # Limite de pontos desenhados no gráfico de performance
+MAX_PLOT_ANNOTATIONS = 50  # Limite de rótulos de dias futuros no gráfico de performance
+PLOT_WIDTH, PLOT_HEIGHT = 1000, 500  # Dimensões do SVG do gráfico de performance
+
+# Figuras reutilizadas entre as requisições, sem a máquina de estados (não thread-safe) do pyplot.
+# São criadas sob demanda para que o matplotlib não seja importado na inicialização da API.
+plot_canvases = {}
+plot_lock = threading.Lock()
+
+def get_plot_canvas(name: str):
     """
-    Middleware para calcular o tempo de processamento de cada requisição e armazená-lo.
+    Retorna o canvas SVG e os eixos reutilizados do gráfico `name`.
+    O matplotlib é importado e a figura é criada apenas no primeiro uso.
+    Deve ser chamada com `plot_lock` adquirido.
+    """
+    if name not in plot_canvases:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_svg import FigureCanvasSVG  # Backend sem GUI
+
+        figure = Figure(figsize=(12, 6))
+        plot_canvases[name] = (FigureCanvasSVG(figure), figure.add_subplot(111))
+    return plot_canvases[name]
+
+class ProcessTimeMiddleware:
+    """
+    Middleware ASGI para calcular o tempo de processamento de cada requisição e armazená-lo.
     Adiciona um cabeçalho `X-Process-Time` à resposta.
+    O número de dias futuros é informado pelo próprio endpoint /predict via `request.state`,
+    evitando a leitura do corpo da requisição dentro do middleware.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_ns = time.perf_counter_ns()
+
+        async def send_wrapper(message):
+            global performance_total
+            if message["type"] == "http.response.start":
+                process_ns = time.perf_counter_ns() - start_ns
+                process_time = process_ns / 1e9
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-process-time", f"{process_time:.6f}".encode()),
+                ]
+
+                path = scope["path"]
+                days_ahead = scope.get("state", {}).get("days_ahead")
+
+                # Log do tempo de resposta com contexto (formatado apenas se o nível INFO estiver habilitado)
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Path: %s, Method: %s, Days Ahead: %s, Process Time: %.4fs", path, scope["method"], days_ahead, process_time)
+
+                # Armazena o tempo de resposta somente se for do endpoint /predict
+                if path == "/predict" and days_ahead is not None:
+                    performance_total += 1
+                    performance_data.append((process_ns, days_ahead))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+# O monitoramento de performance pode ser desabilitado com ENABLE_PERF=0, removendo o middleware
+# (e o custo de medir, registrar e logar cada requisição) por completo
+ENABLE_PERF = os.getenv("ENABLE_PERF", "1") == "1"
+if ENABLE_PERF:
+    app.add_middleware(ProcessTimeMiddleware)
+
+# Micro-batching: requisições concorrentes enviam suas janelas para uma fila e
+# uma tarefa em segundo plano executa o LSTM uma única vez para todo o lote
+MAX_BATCH_SIZE = 32
+# Tamanhos de lote executados: cada lote é completado até a menor potência de 2 que o comporta,
+# limitando as formas que o XLA compila (e os redimensionamentos do TFLite) a poucas, todas aquecidas
+BATCH_SIZES = tuple(sorted({min(2 ** i, MAX_BATCH_SIZE) for i in range(MAX_BATCH_SIZE.bit_length() + 1)}))
+MAX_BATCH_DELAY = 0.010  # Tempo máximo de espera para completar um lote, em segundos
+# A fila e a thread de inferência (abaixo) são criadas no lifespan, a cada inicialização da aplicação,
+# pois a fila pertence ao event loop em execução e a thread é encerrada no desligamento
+inference_queue: Optional[asyncio.Queue] = None
+
+# Número de previsões em andamento usando a fila; cada uma tem no máximo uma janela pendente,
+# então o lote está completo quando reúne uma janela de cada previsão
+active_forecasts = 0
+
+# Thread dedicada à inferência: o TensorFlow já paraleliza cada chamada internamente, então uma
+# única thread evita disputar núcleos entre lotes e não ocupa o threadpool padrão do FastAPI
+inference_executor: Optional[ThreadPoolExecutor] = None
+
+def fail_pending_forecasts(items, error: Exception):
     """
-    start_time = time.time()
-    days_ahead = None  # Inicializa como None para não registrar valores irrelevantes
+    Propaga `error` para as previsões de `items` (pares janela/future) que ainda aguardam resultado.
+    """
+    for _, future in items:
+        # A requisição pode ter sido cancelada enquanto aguardava o lote
+        if not future.done():
+            future.set_exception(error)
 
-    # Verifica se a requisição é para o endpoint /predict com método POST
-    if request.method == "POST" and request.url.path == "/predict":
-        try:
-            body = await request.json()  # Lê o corpo da requisição de forma assíncrona
-            days_ahead = body.get("days_ahead", 0)  # Obtém o valor de days_ahead
-        except Exception as e:
-            logging.error(f"Erro ao extrair 'days_ahead': {e}")
-
-    response = await call_next(request)  # Processa a requisição
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-
-    # Log do tempo de resposta com contexto
-    logging.info(f"Path: {request.url.path}, Method: {request.method}, Days Ahead: {days_ahead}, Process Time: {process_time:.4f}s")
-
-    # Armazena o tempo de resposta somente se for do endpoint /predict
-    if request.url.path == "/predict" and days_ahead is not None:
-        performance_data.append({
-            "path": request.url.path,
-            "process_time": process_time,
-            "days_ahead": days_ahead
-        })
+async def batch_inference_loop():
+    """
+    Agrupa as janelas de entrada acumuladas na fila em um único lote (B, 60, 1),
+    executa o LSTM e entrega a cada requisição a sua previsão.
+    Após a primeira janela, aguarda as demais por até `MAX_BATCH_DELAY` segundos,
+    sem esperar quando todas as previsões em andamento já estão no lote.
+    """
+    loop = asyncio.get_running_loop()
+    # Reutilizado por todos os lotes: o próximo lote só é montado após o término da inferência atual
+    # (as linhas além do lote atual só completam o tamanho e têm suas previsões descartadas)
+    batch_buffer = np.zeros((MAX_BATCH_SIZE, 60, 1), dtype=np.float32)
+    items = []
+    try:
+        while True:
+            # Aguarda a primeira janela sem consumir CPU enquanto a API está ociosa
+            items = [await inference_queue.get()]
+            deadline = loop.time() + MAX_BATCH_DELAY
+            while len(items) < min(MAX_BATCH_SIZE, active_forecasts):
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(inference_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Copia as janelas para o buffer pré-alocado em vez de alocar um novo array a cada lote
+            for i, (window, _) in enumerate(items):
+                batch_buffer[i, :, 0] = window
+            batch = batch_buffer[:next(size for size in BATCH_SIZES if size >= len(items))]
+            try:
+                predictions = await loop.run_in_executor(inference_executor, run_model, batch)
+            except Exception as e:
+                logger.error("Erro durante a inferência em lote: %s", e)
+                fail_pending_forecasts(items, e)
+                continue
+
+            for (_, future), prediction in zip(items, predictions):
+                # A requisição pode ter sido cancelada enquanto aguardava o lote
+                if not future.done():
+                    future.set_result(prediction[0])
+    except asyncio.CancelledError:
+        # Desligamento: as requisições do lote em andamento não devem ficar aguardando para sempre
+        fail_pending_forecasts(items, RuntimeError("A API está sendo encerrada."))
+        raise
+
+def warm_up_model():
+    """
+    Executa inferências de teste para que a compilação dos kernels (incluindo o XLA) e a
+    alocação dos tensores aconteçam na inicialização, e não na primeira requisição.
+    Aquece todos os tamanhos de `BATCH_SIZES`, os únicos enviados pelo micro-batcher,
+    terminando no lote 1, o mais frequente.
+    """
+    if model is None:
+        return
 
-    return response
+    start = time.perf_counter()
+    try:
+        if stateful_model is not None:
+            forecast_stateful(np.zeros(60, dtype=np.float32), 2)
+        for batch_size in sorted(BATCH_SIZES, reverse=True):
+            run_model(np.zeros((batch_size, 60, 1), dtype=np.float32))
+        logger.info("Modelo aquecido em %.2fs.", time.perf_counter() - start)
+    except Exception as e:
+        logger.warning("Não foi possível aquecer o modelo: %s", e)
 
-@app.post("/predict")
-def predict_prices(data: HistoricalData):
+async def forecast_prices(prices: List[float], days_ahead: int) -> np.ndarray:
+    """
+    Normaliza os preços históricos, executa a previsão autorregressiva do LSTM
+    para `days_ahead` dias e retorna os preços futuros na escala original.
+    Cada passo é enviado à fila de micro-batching e agrupado com as demais requisições,
+    exceto no modo stateful.
+    """
+    # Normalizando os dados fornecidos com o escalador do treinamento
+    # (na ausência dele, usa o mínimo e a amplitude do histórico desta requisição)
+    if scaler is not None:
+        data_min, data_range, inv_range = DATA_MIN, DATA_RANGE, INV_RANGE
+    else:
+        data_min = float(min(prices))
+        data_range = float(max(prices)) - data_min or 1.0
+        inv_range = 1.0 / data_range
+
+    # Criando a janela de entrada para o modelo LSTM, convertendo apenas os últimos 60 preços
+    input_window = np.fromiter(prices[-60:], dtype=np.float32, count=60)
+    input_window -= data_min
+    input_window *= inv_range
+
+    loop = asyncio.get_running_loop()
+    if stateful_model is not None:
+        future_prices = await loop.run_in_executor(inference_executor, forecast_stateful, input_window, days_ahead)
+    else:
+        # Fazendo as previsões para múltiplos dias em um array pré-alocado
+        future_prices = np.empty(days_ahead, dtype=np.float64)
+        window = SlidingWindow(input_window)
+
+        global active_forecasts
+        active_forecasts += 1
+        try:
+            for step in range(days_ahead):
+                future = loop.create_future()
+                await inference_queue.put((window.view(), future))
+                prediction = await future
+                future_prices[step] = prediction
+
+                # Desliza a janela no buffer circular, sem copiar os demais valores
+                window.append(prediction)
+        finally:
+            active_forecasts -= 1
+
+    # Revertendo a normalização das previsões no próprio array
+    future_prices *= data_range
+    future_prices += data_min
+    return future_prices
+
+@app.post("/predict", openapi_extra={
+    "requestBody": {"content": {"application/json": {"schema": HISTORICAL_DATA_SCHEMA}}, "required": True}
+})
+async def predict_prices(request: Request):
     """
     Endpoint para realizar previsões de preços com base nos dados históricos fornecidos.
     Também calcula e armazena a acurácia, se os valores reais forem fornecidos.
     """
     try:
+        data = historical_data_decoder.decode(await request.body())
+
         if len(data.prices) < 60:
             raise ValueError("É necessário fornecer pelo menos 60 preços históricos para realizar a previsão.")
 
@@ -109,30 +551,17 @@ def predict_prices(data: HistoricalData):
         if model is None:
             raise ValueError("Modelo não carregado. Verifique se o arquivo do modelo está disponível.")
 
-        # Normalizando os dados fornecidos
-        historical_prices = np.array(data.prices).reshape(-1, 1)
-        scaled_prices = scaler.fit_transform(historical_prices)
-
-        # Criando a sequência de entrada para o modelo LSTM
-        input_sequence = scaled_prices[-60:].reshape(1, 60, 1)
+        # Informa ao middleware de performance o número de dias solicitados,
+        # registrando apenas requisições que passaram pela validação
+        request.state.days_ahead = data.days_ahead
 
-        # Fazendo as previsões para múltiplos dias
-        future_prices = []
-        current_sequence = input_sequence
-
-        for _ in range(data.days_ahead):
-            prediction = model.predict(current_sequence)
-            future_prices.append(prediction[0, 0])
-            current_sequence = np.append(current_sequence[:, 1:, :], [[prediction[0]]], axis=1)
-
-        # Revertendo a normalização das previsões
-        future_prices = scaler.inverse_transform(np.array(future_prices).reshape(-1, 1)).flatten().tolist()
+        future_prices = await forecast_prices(data.prices, data.days_ahead)
 
         # Calcula a acurácia se os valores reais forem fornecidos
         accuracy = None
         if data.real_values:
             real_values = np.array(data.real_values[:len(future_prices)])
-            predicted_values = np.array(future_prices[:len(real_values)])
+            predicted_values = future_prices[:len(real_values)]
             accuracy = np.mean(1 - abs(real_values - predicted_values) / real_values) * 100
 
             # Armazena os dados para o gráfico
@@ -142,19 +571,21 @@ def predict_prices(data: HistoricalData):
                 "accuracy": accuracy
             })
 
-        return {
+        # Resposta retornada diretamente para que o orjson serialize o array NumPy sem `.tolist()`
+        return ORJSONResponse({
             "future_prices": future_prices,
-            "accuracy": round(accuracy, 2) if accuracy is not None else None
-        }
+            "accuracy": round(float(accuracy), 2) if accuracy is not None else None
+        })
     except Exception as e:
-        logging.error(f"Erro durante a previsão: {e}")
+        logger.error("Erro durante a previsão: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.get("/performance")
-def get_performance_data():
+async def get_performance_data():
     """
     Endpoint para retornar os tempos de resposta registrados durante o uso da API.
+    Executado no event loop, o mesmo do middleware, para que o deque não seja alterado durante a leitura.
     - Saída (JSON):
         {
             "performance": [
@@ -162,46 +593,84 @@ def get_performance_data():
                 {"path": "/predict", "process_time": 0.0987, "days_ahead": 5}
             ]
         }
+    Os tempos são armazenados em nanossegundos (inteiros) e convertidos para segundos apenas aqui.
     """
-    return {"performance": performance_data}
-
-@app.get("/performance/plot", response_class=HTMLResponse)
-def plot_performance():
+    total = performance_total
+    new_records = min(total - performance_json_cache["total"], len(performance_data))
+    if new_records > 0:
+        for i in range(len(performance_data) - new_records, len(performance_data)):
+            process_ns, days_ahead = performance_data[i]
+            performance_json_entries.append(orjson.dumps(
+                {"path": "/predict", "process_time": process_ns / 1e9, "days_ahead": days_ahead}
+            ))
+        performance_json_cache["body"] = b'{"performance":[' + b",".join(performance_json_entries) + b"]}"
+        performance_json_cache["total"] = total
+
+    return Response(performance_json_cache["body"], media_type="application/json")
+
+def render_svg(canvas) -> str:
     """
-    Endpoint para gerar e exibir um gráfico visual dos tempos de resposta registrados.
+    Salva o gráfico em memória como SVG, pronto para ser embutido diretamente no HTML.
+    Os textos são mantidos como texto (e não como caminhos), reduzindo o tamanho da resposta.
     """
-    if not performance_data:
-        return HTMLResponse("<h3>Não há dados de performance registrados ainda.</h3>")
+    import matplotlib
 
-    # Extrai os tempos de resposta e dias futuros
-    times = [entry["process_time"] for entry in performance_data]
-    days_ahead = [entry["days_ahead"] for entry in performance_data]
-    requests_ids = list(range(1, len(times) + 1))
-
-    # Cria o gráfico
-    plt.figure(figsize=(12, 6))
-    plt.scatter(requests_ids, times, s=100, c="blue", edgecolor="k", label="Tempo de Resposta")
-    plt.plot(requests_ids, times, linestyle="--", alpha=0.7, label="Tendência")
-
-    # Adiciona o número de dias em cada ponto
-    for i, txt in enumerate(days_ahead):
-        plt.annotate(f"{txt} dias", (requests_ids[i], times[i]), textcoords="offset points", xytext=(0, 10), ha="center", fontsize=9)
-
-    # Configurações do gráfico
-    plt.title("Monitoramento de Tempo de Resposta da API", fontsize=14)
-    plt.xlabel("Número da Requisição", fontsize=12)
-    plt.ylabel("Tempo de Resposta (segundos)", fontsize=12)
-    plt.legend(loc="upper left")
-    plt.grid(True)
-    plt.tight_layout()
-
-    # Salva o gráfico em memória
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format="png")
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    buffer = io.StringIO()
+    with matplotlib.rc_context({"svg.fonttype": "none"}):
+        canvas.print_svg(buffer)
+    svg = buffer.getvalue()
     buffer.close()
 
+    # Remove a declaração XML e o DOCTYPE, desnecessários dentro do HTML
+    return svg[svg.index("<svg"):]
+
+def render_performance_plot(entries: List[Tuple[int, int]], first_id: int) -> str:
+    """
+    Gera o HTML com o gráfico dos tempos de resposta registrados.
+    O SVG é montado diretamente como texto (uma polilinha em uma área fixa), sem o matplotlib.
+    - `entries`: Cópia dos registros de performance a serem exibidos.
+    - `first_id`: Número da requisição correspondente ao primeiro registro.
+    """
+    # Extrai os tempos de resposta e dias futuros
+    records = np.array(entries, dtype=np.int64).reshape(-1, 2)
+    times = records[:, 0] / 1e9
+    days_ahead = records[:, 1]
+    requests_ids = np.arange(first_id, first_id + len(entries))
+
+    # Reduz a quantidade de pontos desenhados quando há muitos registros
+    if times.size > MAX_PLOT_POINTS:
+        stride = -(-times.size // MAX_PLOT_POINTS)
+        times, days_ahead, requests_ids = times[::stride], days_ahead[::stride], requests_ids[::stride]
+
+    # Mapeia os valores para a área do gráfico (o eixo Y do SVG cresce para baixo)
+    left, right, top, bottom = 80, PLOT_WIDTH - 20, 50, PLOT_HEIGHT - 50
+    first, last = int(requests_ids[0]), int(requests_ids[-1])
+    max_time = float(times.max()) * 1.1 or 1.0
+    xs = left + (requests_ids - first) * ((right - left) / max(last - first, 1))
+    ys = bottom - times * ((bottom - top) / max_time)
+    points = " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs.tolist(), ys.tolist()))
+
+    # Marca e rotula com o número de dias apenas parte dos pontos quando há muitos pontos
+    annotation_stride = -(-times.size // MAX_PLOT_ANNOTATIONS)
+    markers = "".join(
+        f'<circle cx="{xs[i]:.1f}" cy="{ys[i]:.1f}" r="5" fill="blue" stroke="black"/>'
+        f'<text x="{xs[i]:.1f}" y="{ys[i] - 10:.1f}" text-anchor="middle" font-size="11">{days_ahead[i]} dias</text>'
+        for i in range(0, times.size, annotation_stride)
+    )
+
+    svg = f"""<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {PLOT_WIDTH} {PLOT_HEIGHT}" width="{PLOT_WIDTH}" height="{PLOT_HEIGHT}" font-family="sans-serif">
+        <text x="{PLOT_WIDTH / 2}" y="25" text-anchor="middle" font-size="16">Monitoramento de Tempo de Resposta da API</text>
+        <polyline points="{left},{top} {left},{bottom} {right},{bottom}" fill="none" stroke="black"/>
+        <polyline points="{points}" fill="none" stroke="steelblue" stroke-dasharray="6,3"/>
+        {markers}
+        <text x="{left - 8}" y="{top + 4}" text-anchor="end" font-size="11">{max_time:.4f}</text>
+        <text x="{left - 8}" y="{bottom + 4}" text-anchor="end" font-size="11">0</text>
+        <text x="{left}" y="{bottom + 18}" text-anchor="middle" font-size="11">{first}</text>
+        <text x="{right}" y="{bottom + 18}" text-anchor="middle" font-size="11">{last}</text>
+        <text x="{(left + right) / 2}" y="{PLOT_HEIGHT - 10}" text-anchor="middle" font-size="13">Número da Requisição</text>
+        <text x="15" y="{(top + bottom) / 2}" text-anchor="middle" font-size="13" transform="rotate(-90 15 {(top + bottom) / 2})">Tempo de Resposta (segundos)</text>
+    </svg>"""
+
     # Explicação do gráfico
     explanation = """
     <h4>Sobre o Gráfico:</h4>
@@ -219,69 +688,94 @@ def plot_performance():
     """
 
     # Retorna o gráfico embutido em HTML com explicação
-    return HTMLResponse(f"""
+    return f"""
     <html>
         <head><title>Monitoramento de Performance</title></head>
         <body>
             <h3>Gráfico de Tempo de Resposta</h3>
-            <img src="data:image/png;base64,{image_base64}" alt="Gráfico de Performance">
+            <div>{svg}</div>
             {explanation}
         </body>
     </html>
-    """)
+    """
 
-@app.get("/accuracy/plot", response_class=HTMLResponse)
-def plot_accuracy():
+@app.get("/performance/plot", response_class=HTMLResponse)
+async def plot_performance():
     """
-    Gera um gráfico comparando os valores reais e previstos armazenados em accuracy_data.
+    Endpoint para gerar e exibir um gráfico visual dos tempos de resposta registrados.
+    O gráfico é reaproveitado enquanto não houver novos registros.
     """
-    if not accuracy_data:
-        return HTMLResponse("<h3>Não há dados de acurácia registrados ainda.</h3>")
+    if not performance_data:
+        return HTMLResponse("<h3>Não há dados de performance registrados ainda.</h3>")
 
-    # Cria o gráfico
-    plt.figure(figsize=(12, 6))
-    for i, entry in enumerate(accuracy_data):
-        real_values = entry["real_values"]
-        predicted_values = entry["predicted_values"]
-        accuracy = entry["accuracy"]
-
-        # Adiciona uma linha para cada previsão
-        plt.plot(range(len(real_values)), real_values, label=f"Real ({i+1})", marker="o")
-        plt.plot(range(len(predicted_values)), predicted_values, label=f"Previsto ({i+1}) - {accuracy:.2f}%", marker="x")
-
-    plt.title("Comparação de Previsão e Acurácia", fontsize=14)
-    plt.xlabel("Dias Futuros", fontsize=12)
-    plt.ylabel("Preço", fontsize=12)
-    plt.legend()
-    plt.grid()
-
-    # Salva o gráfico em memória
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format="png")
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-    buffer.close()
+    # O SVG é montado como texto, rápido o suficiente para ser gerado no próprio event loop
+    total = performance_total
+    if performance_plot_cache["total"] != total:
+        entries = list(performance_data)
+        first_id = total - len(entries) + 1
+        performance_plot_cache["html"] = render_performance_plot(entries, first_id)
+        performance_plot_cache["total"] = total
+
+    return HTMLResponse(performance_plot_cache["html"], headers=PLOT_CACHE_HEADERS)
+
+def render_accuracy_plot() -> str:
+    """
+    Gera o HTML com o gráfico comparando os valores reais e previstos armazenados em accuracy_data.
+    """
+    with plot_lock:
+        # Limpa e reutiliza o gráfico
+        canvas, ax = get_plot_canvas("accuracy")
+        ax.cla()
+        for i, entry in enumerate(accuracy_data):
+            real_values = entry["real_values"]
+            predicted_values = entry["predicted_values"]
+            accuracy = entry["accuracy"]
+
+            # Adiciona uma linha para cada previsão
+            ax.plot(range(len(real_values)), real_values, label=f"Real ({i+1})", marker="o")
+            ax.plot(range(len(predicted_values)), predicted_values, label=f"Previsto ({i+1}) - {accuracy:.2f}%", marker="x")
+
+        ax.set_title("Comparação de Previsão e Acurácia", fontsize=14)
+        ax.set_xlabel("Dias Futuros", fontsize=12)
+        ax.set_ylabel("Preço", fontsize=12)
+        ax.legend()
+        ax.grid(True)
+
+        # Salva o gráfico em memória
+        svg = render_svg(canvas)
 
     # Retorna o gráfico como HTML
-    return HTMLResponse(f"""
+    return f"""
     <html>
         <head><title>Gráfico de Acurácia</title></head>
         <body>
             <h3>Gráfico de Comparação de Previsão</h3>
-            <img src="data:image/png;base64,{image_base64}" alt="Gráfico de Acurácia">
+            <div>{svg}</div>
         </body>
     </html>
-    """)
+    """
 
-@app.get("/predicaoPrecos", response_class=HTMLResponse)
-def render_interface():
+@app.get("/accuracy/plot", response_class=HTMLResponse)
+async def plot_accuracy():
     """
-    Interface gráfica para enviar dados ao endpoint /predict.
-    Também exibe os resultados mais recentes de previsão, se existirem.
+    Gera um gráfico comparando os valores reais e previstos armazenados em accuracy_data.
+    O matplotlib é bloqueante, então o gráfico é gerado em uma thread separada
+    e reaproveitado enquanto não houver novos registros.
     """
-    # Verifica se há dados de previsão registrados
-    latest_data = accuracy_data[-1] if accuracy_data else None
+    if not accuracy_data:
+        return HTMLResponse("<h3>Não há dados de acurácia registrados ainda.</h3>")
+
+    data_len = len(accuracy_data)
+    if accuracy_plot_cache["len"] != data_len:
+        accuracy_plot_cache["html"] = await asyncio.to_thread(render_accuracy_plot)
+        accuracy_plot_cache["len"] = data_len
 
+    return HTMLResponse(accuracy_plot_cache["html"], headers=PLOT_CACHE_HEADERS)
+
+def build_interface_html(latest_data: Optional[dict]) -> str:
+    """
+    Gera o HTML da interface gráfica com os resultados da previsão mais recente, se existirem.
+    """
     # HTML do container de resultados (inicialmente vazio ou com os últimos dados)
     results_html = """
     <div id="results" class="output">
@@ -388,11 +882,34 @@ def render_interface():
     </body>
     </html>
     """
-    return HTMLResponse(content=html_content)
+    return html_content
+
+@app.get("/predicaoPrecos", response_class=HTMLResponse)
+async def render_interface(request: Request):
+    """
+    Interface gráfica para enviar dados ao endpoint /predict.
+    Também exibe os resultados mais recentes de previsão, se existirem.
+    A página só muda quando há uma nova previsão, então é codificada (e comprimida com gzip)
+    uma única vez por versão de accuracy_data. Executado no event loop, o mesmo que atualiza
+    accuracy_data, para que as duas versões da página em cache sejam sempre da mesma previsão.
+    """
+    data_len = len(accuracy_data)
+    if interface_cache["len"] != data_len:
+        html_bytes = build_interface_html(accuracy_data[data_len - 1] if data_len else None).encode("utf-8")
+        interface_cache["html"] = html_bytes
+        interface_cache["gzip"] = gzip.compress(html_bytes, 6)
+        interface_cache["len"] = data_len
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(interface_cache["gzip"], media_type="text/html", headers=INTERFACE_GZIP_HEADERS)
+    return Response(interface_cache["html"], media_type="text/html", headers={"Vary": "Accept-Encoding"})
+
 
+# Resposta do endpoint raiz, serializada uma única vez
+ROOT_RESPONSE = orjson.dumps({"message": "API de previsão de preços está funcionando! Envie dados históricos e o número de dias para obter previsões."})
 
 @app.get("/")
-def root():
+async def root():
     """
     Endpoint para verificar se a API está funcionando.
     - Saída (JSON):
@@ -400,4 +917,4 @@ def root():
             "message": "API de previsão de preços está funcionando! Envie dados históricos e o número de dias para obter previsões."
         }
     """
-    return {"message": "API de previsão de preços está funcionando! Envie dados históricos e o número de dias para obter previsões."}
\ No newline at end of file
+    return Response(ROOT_RESPONSE, media_type="application/json")
\ No newline at end of file